@@ -1,21 +1,55 @@
 import re
 import os
+import sys
+import io
+import csv
 import json
-import copy
 import psycopg2
-from psycopg2.extras import Json
+from psycopg2.extras import execute_values
 from lark import Lark, Transformer, v_args
 
 # =============================================================================
 # JCL PREPROCESSOR
 # =============================================================================
 
+# Per-statement helper patterns, compiled once for the module
+_RE_SET = re.compile(r"SET\s+([A-Z0-9$#@]{1,8})=([^,\s]+)", re.IGNORECASE)
+_RE_DLM = re.compile(r"DLM=([^\s,]{2})", re.IGNORECASE)
+_RE_ORDER = re.compile(r"ORDER=\((.*?)\)", re.IGNORECASE)
+_RE_THEN = re.compile(r"\s+THEN($|\s+)", re.IGNORECASE)
+_RE_THEN_END = re.compile(r"\s+THEN$", re.IGNORECASE)
+_RE_EXEC_OPERAND_SEP = re.compile(r"[,\s]")
+
+# Read buffer for JCL, PROC and INCLUDE members; most members then need a single read syscall
+_READ_BUFFER = 1 << 20
+
+# Optional label plus operation field; one match classifies every preprocessed statement
+_RE_DISPATCH = re.compile(
+    r"^//([A-Z$#@][A-Z0-9$#@]{0,7})?\s+(?P<kind>JOB|EXEC|DD|PROC|PEND|INCLUDE|IF|ELSE|ENDIF|SET|JCLLIB"
+    r"|CNTL|ENDCNTL|EXPORT|NOTIFY|OUTPUT|SCHEDULE)(?=\s|$)", re.IGNORECASE)
+_JOB_ADMIN_OPS = frozenset(("JOB", "CNTL", "ENDCNTL", "EXPORT", "NOTIFY", "OUTPUT", "SCHEDULE"))
+
+def _find_unquoted(text, char, start=0):
+    """Index of the first char outside single quotes, or -1. Hops between quotes with str.find."""
+    pos = start
+    while True:
+        hit = text.find(char, pos)
+        if hit < 0: return -1
+        quote = text.find("'", pos)
+        if quote < 0 or hit < quote: return hit
+        close = text.find("'", quote + 1)
+        if close < 0: return -1
+        pos = close + 1
+
 class JCLPreprocessor:
     def __init__(self, config):
         self.config = config
         self.system_type = config.get("SYSTEM", "LWM")
         self.symbol_table = {}
+        self._sym_re = None  # Compiled lazily from symbol_table by apply_symbolics
+        self._sym_vals = {}  # Resolved symbol values, rebuilt alongside _sym_re
         self.procedure_map = {}
+        self._expansion_cache = {}  # (proc, resolved symbols) -> expanded statements
         
         # Resolve pathing and search libraries
         path_input = config.get("PATH", ".")
@@ -25,20 +59,22 @@ class JCLPreprocessor:
         # lib_paths is used for searching PROCs and INCLUDEs
         self.lib_paths = ([path_input] if path_input else []) + (lib_input if isinstance(lib_input, list) else [])
         self.ext = config.get("EXT", "")
+        self._path_cache = {}  # (member, is_main_file, lib_paths, ext) -> path or None
         
-        # Regex patterns for statement identification
-        self.re_job_admin = re.compile(r"//([A-Z$#@][A-Z0-9$#@]{0,7})?\s+(JOB|CNTL|ENDCNTL|EXPORT|NOTIFY|OUTPUT|SCHEDULE|JCLLIB|SET)(\s+|$)", re.IGNORECASE)
-        self.re_if = re.compile(r"//([A-Z$#@][A-Z0-9$#@]{0,7})?\s+IF\s+(.*)", re.IGNORECASE)
-        self.re_else = re.compile(r"//([A-Z$#@][A-Z0-9$#@]{0,7})?\s+ELSE", re.IGNORECASE)
-        self.re_endif = re.compile(r"//([A-Z$#@][A-Z0-9$#@]{0,7})?\s+ENDIF", re.IGNORECASE)
-        self.re_proc_start = re.compile(r"//([A-Z$#@][A-Z0-9$#@]{0,7})\s+PROC(\s+|$)", re.IGNORECASE)
-        self.re_pend = re.compile(r"//\s+PEND(\s+|$)", re.IGNORECASE)
-        self.re_include = re.compile(r"//\s+INCLUDE\s+MEMBER=([A-Z$#@][A-Z0-9$#@]{0,7})", re.IGNORECASE)
-        self.re_exec = re.compile(r"//([A-Z$#@][A-Z0-9$#@]{0,7})?\s+EXEC\s+(PGM=|PROC=)?([A-Z$#@][A-Z0-9$#@]{0,7})", re.IGNORECASE)
-        self.re_dd_instream = re.compile(r"//([A-Z$#@][A-Z0-9$#@]{0,7})?\s+DD\s+(\*|DATA)", re.IGNORECASE)
+        # Regex patterns for statement identification (all anchored at column 1, used with match)
+        self.re_if = re.compile(r"^//([A-Z$#@][A-Z0-9$#@]{0,7})?\s+IF\s+(.*)", re.IGNORECASE)
+        self.re_pend = re.compile(r"^//\s+PEND(\s+|$)", re.IGNORECASE)
+        self.re_include = re.compile(r"^//\s+INCLUDE\s+MEMBER=([A-Z$#@][A-Z0-9$#@]{0,7})", re.IGNORECASE)
+        self.re_exec = re.compile(r"^//([A-Z$#@][A-Z0-9$#@]{0,7})?\s+EXEC\s+(PGM=|PROC=)?([A-Z$#@][A-Z0-9$#@]{0,7})", re.IGNORECASE)
+        self.re_dd_instream = re.compile(r"^//([A-Z$#@][A-Z0-9$#@]{0,7})?\s+DD\s+(\*|DATA)", re.IGNORECASE)
 
     def resolve_path(self, member_name, is_main_file=False):
         """Locates JCL member using configured search paths and extensions."""
+        key = (member_name, is_main_file, tuple(self.lib_paths), self.ext)
+        if key in self._path_cache: return self._path_cache[key]
+        
+        # Misses are cached as None so repeated EXECs of unknown names don't re-stat every library
+        resolved = None
         search_libs = [self.path_val] if is_main_file else self.lib_paths
         for base in search_libs:
             if not base: continue
@@ -49,16 +85,16 @@ class JCLPreprocessor:
                 path = os.path.join(base, filename)
             
             if self.system_type != "Z" and os.path.exists(path):
-                return path
+                resolved = path; break
             elif self.system_type == "Z":
-                return path
-        return None
+                resolved = path; break
+        self._path_cache[key] = resolved
+        return resolved
 
     def clean_line(self, line):
         """Strips columns 73-80 and filters JCL comments."""
-        line = line.rstrip('\n').rstrip('\r')
-        line = line[:72]
-        if line.startswith("//*") or line.startswith("/*") or line.strip() == "//":
+        line = line[:72].rstrip('\r\n')
+        if line.startswith(("//*", "/*")) or line.strip() == "//":
             return None
         return line
 
@@ -76,35 +112,32 @@ class JCLPreprocessor:
             operands_and_comment = parts[2]
             
             if parts[1].upper() == "IF":
-                then_match = re.search(r"\s+THEN($|\s+)", operands_and_comment, re.IGNORECASE)
+                then_match = _RE_THEN.search(operands_and_comment)
                 if then_match:
                     operands = operands_and_comment[:then_match.start()].strip()
                     return f"{prefix} {operands} THEN"
                 else:
                     return f"{prefix} {operands_and_comment.strip()}"
 
-        in_quotes = False
-        end_idx = len(operands_and_comment)
-        for i, char in enumerate(operands_and_comment):
-            if char == "'": in_quotes = not in_quotes
-            elif char == " " and not in_quotes:
-                end_idx = i
-                break
-        operands = operands_and_comment[:end_idx]
+        # Most operand fields carry no quoted literals, so a single find locates the comment
+        if "'" not in operands_and_comment: end_idx = operands_and_comment.find(" ")
+        else: end_idx = _find_unquoted(operands_and_comment, " ")
+        operands = operands_and_comment if end_idx < 0 else operands_and_comment[:end_idx]
         return (prefix + " " + operands).strip() if prefix else operands.strip()
 
     def parse_params(self, param_string):
         """Standard JCL param parser (KEY=VAL) for symbol resolution."""
         params = {}
         if not param_string: return params
-        parts, current, in_quotes = [], [], False
-        for char in param_string:
-            if char == "'": in_quotes = not in_quotes
-            if char == "," and not in_quotes:
-                parts.append("".join(current)); current = []
-            else:
-                current.append(char)
-        parts.append("".join(current))
+        if "'" not in param_string:
+            parts = param_string.split(",")
+        else:
+            # Quotes open mid-field (PARM='A,B'), which csv.reader does not honour, so scan for them
+            parts, pos = [], 0
+            while True:
+                comma = _find_unquoted(param_string, ",", pos)
+                if comma < 0: parts.append(param_string[pos:]); break
+                parts.append(param_string[pos:comma]); pos = comma + 1
         for p in parts:
             if "=" in p:
                 k, v = p.split("=", 1)
@@ -118,134 +151,177 @@ class JCLPreprocessor:
             path = self.resolve_path(proc_name)
             if path:
                 try:
-                    with open(path, 'r') as f:
-                        lines = f.readlines()
-                        proc_data = {"header": lines[0], "body": lines[1:]}
+                    with open(path, 'r', buffering=_READ_BUFFER) as f:
+                        header = f.readline()
+                        if header: proc_data = {"header": header, "body": f.readlines()}
                 except Exception: pass
-        if not proc_data: return [exec_stmt]
+        if not proc_data: return [("STMT", exec_stmt)]
         
-        local_symbols = copy.deepcopy(self.symbol_table)
+        local_symbols = dict(self.symbol_table)
         header_stmt = proc_data["header"]
         if " PROC " in header_stmt.upper():
             proc_part = header_stmt.upper().split("PROC", 1)[1]
             local_symbols.update(self.parse_params(proc_part))
         
         exec_operands = exec_stmt.split("EXEC", 1)[1].strip()
-        match = re.search(r"[,\s]", exec_operands)
+        match = _RE_EXEC_OPERAND_SEP.search(exec_operands)
         if match:
             param_str = exec_operands[match.start()+1:].strip()
             local_symbols.update(self.parse_params(param_str))
             
-        old_symbols = self.symbol_table
-        self.symbol_table = local_symbols
-        expanded = self.process_line_list(proc_data["body"])
-        self.symbol_table = old_symbols
-        return [f"*PROC_START* label={outer_label} proc={proc_name}"] + expanded + ["*PROC_END*"]
+        # Same proc with the same resolved symbols expands identically; the tuples are immutable
+        # so the cached list is shared. Cleared when JCLLIB or an in-stream PROC changes the sources.
+        cache_key = (proc_name, tuple(sorted(local_symbols.items())))
+        expanded = self._expansion_cache.get(cache_key)
+        if expanded is None:
+            old_symbols, old_sym_re, old_sym_vals = self.symbol_table, self._sym_re, self._sym_vals
+            self.symbol_table, self._sym_re = local_symbols, None
+            expanded = self.process_line_list(proc_data["body"])
+            self.symbol_table, self._sym_re, self._sym_vals = old_symbols, old_sym_re, old_sym_vals
+            self._expansion_cache[cache_key] = expanded
+        return [("PROC_START", outer_label, proc_name)] + expanded + [("PROC_END",)]
 
     def process_line_list(self, lines):
-        """Main preprocessor logic for flattening JCL and handling logical blocks."""
+        """Main preprocessor logic for flattening JCL and handling logical blocks.
+        Accepts any iterable of lines (list or open file) and consumes it once.
+        Returns tagged tuples: ("STMT", stmt), ("PAYLOAD", text), ("PROC_START", label, proc),
+        ("PROC_END",), ("IF_START", condition), ("IF_ELSE",) and ("IF_END",)."""
         statements = []
-        current_statement = ""
+        current_parts = []
         is_continuing = False
-        idx = 0
-        while idx < len(lines):
-            line_raw = lines[idx]; line = self.clean_line(line_raw); idx += 1
+        it, held = iter(lines), None
+        while True:
+            # 'held' is a card read ahead by an inner loop that still needs outer processing
+            line_raw = held if held is not None else next(it, None); held = None
+            if line_raw is None: break
+            line = self.clean_line(line_raw)
             if line is None: continue
             cleaned_content = self.strip_jcl_comment(line, is_continuing)
             ends_with_comma = cleaned_content.endswith(",")
-            current_statement += cleaned_content
+            current_parts.append(cleaned_content)
             if ends_with_comma:
                 is_continuing = True; continue
             is_continuing = False
-            stmt = self.apply_symbolics(current_statement); current_statement = ""
+            stmt = self.apply_symbolics("".join(current_parts)); current_parts = []
             
+            # Classify the statement by its operation field with a single match
+            op_match = _RE_DISPATCH.match(stmt)
+            kind = op_match.group('kind').upper() if op_match else None
+
             # Handle JCL IF/THEN/ELSE/ENDIF determination logic
-            if self.re_if.search(stmt):
-                m = self.re_if.search(stmt)
-                condition = re.sub(r"\s+THEN$", "", m.group(2).strip(), flags=re.IGNORECASE)
-                statements.append(f"*IF_START* condition='{condition}'")
-                continue
-            if self.re_else.search(stmt):
-                statements.append("*IF_ELSE*"); continue
-            if self.re_endif.search(stmt):
-                statements.append("*IF_END*"); continue
-
-            proc_match = self.re_proc_start.search(stmt)
-            if proc_match:
-                proc_name, proc_header, proc_body = proc_match.group(1).upper(), stmt, []
-                while idx < len(lines):
-                    p_line_raw = lines[idx]
+            if kind == "IF":
+                m = self.re_if.match(stmt)
+                if m:
+                    condition = _RE_THEN_END.sub("", m.group(2).strip())
+                    statements.append(("IF_START", condition))
+                    continue
+            elif kind == "ELSE":
+                statements.append(("IF_ELSE",)); continue
+            elif kind == "ENDIF":
+                statements.append(("IF_END",)); continue
+
+            elif kind == "PROC" and op_match.group(1):
+                proc_name, proc_header, proc_body = op_match.group(1).upper(), stmt, []
+                for p_line_raw in it:
                     p_line_cleaned = self.clean_line(p_line_raw)
-                    if p_line_cleaned and self.re_pend.search(p_line_cleaned):
-                        idx += 1; break
-                    proc_body.append(p_line_raw); idx += 1
+                    if p_line_cleaned and self.re_pend.match(p_line_cleaned): break
+                    proc_body.append(p_line_raw)
                 self.procedure_map[proc_name] = {"header": proc_header, "body": proc_body}
+                self._expansion_cache.clear()
                 continue
                 
-            if " SET " in stmt.upper() or stmt.startswith("// SET "): self.update_symbols(stmt); continue
-            if "JCLLIB " in stmt.upper(): self.update_lib_paths(stmt); continue
-            if self.re_job_admin.search(stmt): continue
+            elif kind == "SET": self.update_symbols(stmt); continue
+            elif kind == "JCLLIB": self.update_lib_paths(stmt); continue
+            elif kind in _JOB_ADMIN_OPS: continue
             
-            include_match = self.re_include.search(stmt)
-            if include_match:
-                path = self.resolve_path(include_match.group(1).upper())
-                if path: statements.extend(self.preprocess_file(path))
-                continue
-                
-            exec_match = self.re_exec.search(stmt)
-            if exec_match:
-                is_explicit_pgm = "PGM=" in (exec_match.group(2) or "").upper()
-                name = exec_match.group(3).upper()
-                outer_label = exec_match.group(1) or ""
-                if not is_explicit_pgm and (name in self.procedure_map or self.resolve_path(name)):
-                    statements.extend(self.expand_procedure(name, stmt, outer_label))
+            elif kind == "INCLUDE":
+                include_match = self.re_include.match(stmt)
+                if include_match:
+                    path = self.resolve_path(include_match.group(1).upper())
+                    if path: statements.extend(self.preprocess_file(path))
                     continue
+                
+            elif kind == "EXEC":
+                exec_match = self.re_exec.match(stmt)
+                if exec_match:
+                    is_explicit_pgm = "PGM=" in (exec_match.group(2) or "").upper()
+                    name = exec_match.group(3).upper()
+                    outer_label = exec_match.group(1) or ""
+                    if not is_explicit_pgm and (name in self.procedure_map or self.resolve_path(name)):
+                        statements.extend(self.expand_procedure(name, stmt, outer_label))
+                        continue
             
-            if self.re_dd_instream.search(stmt):
-                statements.append(stmt)
-                dlm = "/*"; dlm_match = re.search(r"DLM=([^\s,]{2})", stmt, re.IGNORECASE)
+            elif kind == "DD" and self.re_dd_instream.match(stmt):
+                statements.append(("STMT", stmt))
+                dlm = "/*"; dlm_match = _RE_DLM.search(stmt)
                 if dlm_match: dlm = dlm_match.group(1).replace("'", "").replace('"', "")
-                while idx < len(lines):
-                    p_line_raw = lines[idx].rstrip()
-                    if (dlm == "/*" and (p_line_raw.startswith("//") or p_line_raw.startswith("/*"))) or \
-                       (dlm != "/*" and p_line_raw.startswith(dlm)):
-                        if dlm != "/*" and p_line_raw.startswith(dlm): idx += 1
+                for p_line_raw in it:
+                    p_line = p_line_raw.rstrip()
+                    if (dlm == "/*" and (p_line.startswith("//") or p_line.startswith("/*"))) or \
+                       (dlm != "/*" and p_line.startswith(dlm)):
+                        # A custom DLM card is consumed; '//' or '/*' is left for the outer loop
+                        if dlm == "/*": held = p_line_raw
                         break
-                    statements.append(f"*PAYLOAD* {p_line_raw[:72]}"); idx += 1
+                    statements.append(("PAYLOAD", p_line[:72]))
                 continue
-            statements.append(stmt)
+            statements.append(("STMT", stmt))
         return statements
 
     def preprocess_file(self, file_path):
         if not file_path: return []
         try:
-            with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                lines = f.readlines()
-            return self.process_line_list(lines)
+            with open(file_path, 'r', encoding='utf-8', errors='ignore', buffering=_READ_BUFFER) as f:
+                return self.process_line_list(f)
         except Exception: return []
 
     def apply_symbolics(self, stmt):
-        for sym in sorted(self.symbol_table.keys(), key=len, reverse=True):
-            val = str(self.symbol_table[sym])
-            stmt = stmt.replace(f"&{sym}..", f"{val}.").replace(f"&{sym}.", val).replace(f"&{sym}", val)
-        return stmt
+        """Resolves &SYM, &SYM. and &SYM.. references with a cached alternation regex."""
+        if not self.symbol_table or "&" not in stmt: return stmt
+        if self._sym_re is None:
+            self._sym_vals = {}
+            # Longest names first so &HLQX is not consumed as &HLQ followed by X
+            names = "|".join(re.escape(k) for k in sorted(self.symbol_table, key=len, reverse=True))
+            self._sym_re = re.compile(r"&(" + names + r")(\.\.|\.)?")
+        symbols, sym_re, resolved = self.symbol_table, self._sym_re, self._sym_vals
+        def _value(name, seen):
+            # Values may reference other symbols (e.g. PROC defaults like OUTDSN=&HLQ..OUT), so
+            # each value is expanded on its own; a name already being expanded is left literal.
+            val = str(symbols[name])
+            if "&" not in val: return val
+            seen = seen | {name}
+            return sym_re.sub(lambda m: m.group(0) if m.group(1) in seen else _ref(m, seen), val)
+        def _ref(m, seen):
+            val = _value(m.group(1), seen)
+            return val + "." if m.group(2) == ".." else val
+        def _sub(m):
+            name = m.group(1)
+            val = resolved.get(name)
+            if val is None:
+                val = resolved[name] = _value(name, frozenset())
+            return val + "." if m.group(2) == ".." else val
+        # Single pass over the statement: substituted text is never re-scanned
+        return sym_re.sub(_sub, stmt)
 
     def update_symbols(self, stmt):
-        match = re.search(r"SET\s+([A-Z0-9$#@]{1,8})=([^,\s]+)", stmt, re.IGNORECASE)
-        if match: self.symbol_table[match.group(1).upper()] = match.group(2).strip("'")
+        match = _RE_SET.search(stmt)
+        if match:
+            self.symbol_table[match.group(1).upper()] = match.group(2).strip("'")
+            self._sym_re = None
 
     def update_lib_paths(self, stmt):
-        match = re.search(r"ORDER=\((.*?)\)", stmt, re.IGNORECASE)
+        match = _RE_ORDER.search(stmt)
         if match:
             new_paths = [p.strip().strip("'").strip('"') for p in match.group(1).split(",")]
             self.lib_paths = new_paths + self.lib_paths
+            self._path_cache.clear()
+            self._expansion_cache.clear()
 
 # =============================================================================
 # LARK GRAMMAR & TRANSFORMER
 # =============================================================================
 
 JCL_GRAMMAR = r"""
-    ?start: line+
+    start: line+
     ?line: exec_statement | unnamed_exec | dd_statement | unnamed_dd
 
     exec_statement: "//" JCL_ID OP_EXEC exec_content
@@ -336,13 +412,16 @@ JCL_GRAMMAR = r"""
     %import common.NUMBER
     %import common.WS_INLINE
     %ignore WS_INLINE
+    %ignore /\n/
 """
 
 class JCLTransformer(Transformer):
-    def JCL_ID(self, s): return str(s)
-    def VALUE(self, s): return str(s)
+    def start(self, children): return children
+    # Labels, program names and keyword values recur across a project, so share one copy of each
+    def JCL_ID(self, s): return sys.intern(str(s))
+    def VALUE(self, s): return sys.intern(str(s))
     def NUMBER(self, n): return int(n)
-    def RECFM_VALUE(self, s): return str(s)
+    def RECFM_VALUE(self, s): return sys.intern(str(s))
     def JCL_QUOTED_STRING(self, s): return str(s).strip("'").replace("''", "'")
     def _merge_dicts(self, children):
         res = {}; [res.update(c) for c in children if isinstance(c, dict)]; return res
@@ -379,43 +458,160 @@ class JCLTransformer(Transformer):
     def instream_star(self, children): return {"INSTREAM": "*"}
     def instream_data(self, children): return {"INSTREAM": "DATA"}
     def dummy_param(self, children): return {"DUMMY": True}
-    def exec_keyword(self, children): return {str(children[0]): str(children[-1])}
-    def symbolic_override(self, children): return {str(children[0]): str(children[-1])}
-    def keyword_param(self, children): return {str(children[0]): str(children[-1])}
+    def exec_keyword(self, children): return {sys.intern(str(children[0])): str(children[-1])}
+    def symbolic_override(self, children): return {sys.intern(str(children[0])): str(children[-1])}
+    def keyword_param(self, children): return {sys.intern(str(children[0])): str(children[-1])}
     def list_val(self, children): return [str(c) for c in children if str(c) not in ("(", ")", ",")]
 
+# Built once per process; cache=True reloads the serialized LALR tables from the temp dir
+# on later runs instead of recompiling the grammar. The transformer is stateless and shared.
+_PARSER = Lark(JCL_GRAMMAR, parser='lalr', transformer=JCLTransformer(), cache=True)
+
+def _terminal_words(*names):
+    """Literal alternatives of the named grammar terminals, e.g. DSN_KW -> ("DSNAME", "DSN")."""
+    words = []
+    for name in names:
+        pattern = _PARSER.get_terminal(name).pattern
+        body = pattern.value
+        if pattern.type != "str" and body.startswith("(?:") and body.endswith(")"): body = body[3:-1]
+        alts = [body] if pattern.type == "str" else body.split("|")
+        if not all(w.isalnum() for w in alts): raise ValueError(f"Terminal {name} is not a keyword list: {pattern.value}")
+        words.extend(alts)
+    return tuple(words)
+
+def _terminal_re(name): return re.compile(_PARSER.get_terminal(name).pattern.to_regexp())
+
+# Fast path for plain EXEC/DD cards: no quotes, parentheses, symbolics or blanks in the operands.
+# The tables below are read from the grammar's terminals; anything outside them is left to Lark.
+_RE_SIMPLE_CARD = re.compile(r"//([A-Z#$@][A-Z0-9#$@]{0,7})?\s+(EXEC|DD)\s+([A-Z0-9.#$@*+<>=,]+)$")
+_RE_SIMPLE_VALUE = _terminal_re("VALUE")
+_RE_SIMPLE_ID = _terminal_re("JCL_ID")
+_RE_SIMPLE_RECFM = _terminal_re("RECFM_VALUE")
+_EXEC_KEYWORDS = _terminal_words("PGM_KW", "PROC_KW", "PARM_KW", "EXEC_KW")
+_DD_KEYWORDS = frozenset(_terminal_words("KEYWORD", "DSORG_KW", "DCB_KW"))
+_DSN_KEYWORDS = frozenset(_terminal_words("DSN_KW"))
+_DISP_KEYWORDS = frozenset(_terminal_words("DISP_KW"))
+_NUMBER_KEYWORDS = frozenset(_terminal_words("LRECL_KW", "BLKSIZE_KW"))
+_RECFM_KEYWORDS = frozenset(_terminal_words("RECFM_KW"))
+_DD_POSITIONAL = {"*": ("INSTREAM", "*"), "DATA": ("INSTREAM", "DATA"), "DUMMY": ("DUMMY", True)}
+_DISP_VALUES = frozenset(_terminal_words("DISP_VAL"))
+
 class JCLParserManager:
     def __init__(self):
-        self.parser = Lark(JCL_GRAMMAR, parser='lalr', transformer=JCLTransformer())
+        self.parser = _PARSER
         self.steps = []
         self.current_step = None
     
+    def parse_run(self, run):
+        """Parses a run of JCL statements in one Lark call, falling back per statement on error."""
+        try:
+            trees = self.parser.parse("\n".join(run))
+            if len(trees) == len(run): return trees
+        except Exception: pass
+        trees = []
+        for stmt in run:
+            try:
+                parsed = self.parser.parse(stmt)
+                trees.append(parsed[0] if len(parsed) == 1 else None)
+            except Exception as e:
+                print(f"Parser Error: {stmt}\n{e}")
+                trees.append(None)
+        return trees
+
+    def parse_simple(self, stmt):
+        """Builds the Lark result for a plain EXEC/DD card directly; None means use the grammar."""
+        m = _RE_SIMPLE_CARD.match(stmt)
+        if not m: return None
+        label, op, operands = m.groups()
+        # Labels starting with an operation keyword are tokenized specially by the grammar
+        if label and label.startswith(("DD", "EXEC")): return None
+        if label: label = sys.intern(label)
+        items = operands.split(",")
+        trailing = len(items) > 1 and not items[-1]
+        if trailing: items.pop()
+        params = {}
+        if op == "EXEC":
+            # The first operand must be a positional procedure name or an EXEC keyword
+            if "=" not in items[0]:
+                if items[0].startswith(_EXEC_KEYWORDS) or not _RE_SIMPLE_VALUE.fullmatch(items[0]): return None
+                params["PROC"] = sys.intern(items.pop(0))
+                if trailing and not items: return None
+            elif items[0].partition("=")[0] not in _EXEC_KEYWORDS: return None
+            for item in items:
+                key, _, val = item.partition("=")
+                if not _RE_SIMPLE_VALUE.fullmatch(val) or "=" in val: return None
+                key, val = sys.intern(key), sys.intern(val)
+                if key in _EXEC_KEYWORDS: params[key] = val
+                elif _RE_SIMPLE_ID.fullmatch(key) and not key.startswith(_EXEC_KEYWORDS): params[key] = val
+                else: return None
+        else:
+            for item in items:
+                if item in _DD_POSITIONAL:
+                    key, val = _DD_POSITIONAL[item]; params[key] = val; continue
+                key, _, val = item.partition("=")
+                if not _RE_SIMPLE_VALUE.fullmatch(val) or "=" in val: return None
+                key, val = sys.intern(key), sys.intern(val)
+                if key in _DSN_KEYWORDS:
+                    if "*" in val: return None
+                    params["DSN"] = val
+                elif key in _DISP_KEYWORDS:
+                    if val not in _DISP_VALUES: return None
+                    params["DISP"] = [val]
+                elif key in _NUMBER_KEYWORDS:
+                    if not val.isdigit(): return None
+                    params[key] = str(int(val))
+                elif key in _RECFM_KEYWORDS:
+                    if not _RE_SIMPLE_RECFM.fullmatch(val): return None
+                    params[key] = val
+                elif key in _DD_KEYWORDS: params[key] = val
+                else: return None
+        return {"type": op, "label": label, "params": params}
+
+    def parse_statements(self, results_list):
+        """Returns one parse tree per entry of results_list (None for preprocessor markers).
+        Plain cards are built by parse_simple; the rest go to Lark in runs split at markers."""
+        trees, run = [None] * len(results_list), []
+        def flush():
+            for i, tree in zip(run, self.parse_run([results_list[i][1] for i in run])): trees[i] = tree
+            run.clear()
+        for i, item in enumerate(results_list):
+            if item[0] != "STMT":
+                if run: flush()
+                continue
+            trees[i] = self.parse_simple(item[1])
+            if trees[i] is None: run.append(i)
+        if run: flush()
+        return trees
+
     def process_results(self, results_list):
         proc_stack, if_stack = [], []
-        for stmt in results_list:
-            if stmt.startswith("*PROC_START*"):
-                m = re.search(r"label=(.*) proc=(.*)", stmt)
-                if m: proc_stack.append({'label': m.group(1), 'proc': m.group(2)})
+        for item, tree in zip(results_list, self.parse_statements(results_list)):
+            tag = item[0]
+            if tag == "PROC_START":
+                proc_stack.append({'label': item[1], 'proc': item[2]})
                 continue
-            if stmt.startswith("*PROC_END*"):
-                if proc_stack: proc_stack.pop(); continue
-            if stmt.startswith("*IF_START*"):
-                m = re.search(r"condition='(.*)'", stmt)
-                if m: if_stack.append({'expr': m.group(1), 'is_else': False})
+            if tag == "PROC_END":
+                if proc_stack: proc_stack.pop()
                 continue
-            if stmt.startswith("*IF_ELSE*"):
-                if if_stack: if_stack[-1]['is_else'] = True; continue
-            if stmt.startswith("*IF_END*"):
-                if if_stack: if_stack.pop(); continue
-            if stmt.startswith("*PAYLOAD*"):
+            if tag == "IF_START":
+                if_stack.append({'expr': item[1], 'is_else': False})
+                continue
+            if tag == "IF_ELSE":
+                if if_stack: if_stack[-1]['is_else'] = True
+                continue
+            if tag == "IF_END":
+                if if_stack: if_stack.pop()
+                continue
+            if tag == "PAYLOAD":
                 if self.steps and self.steps[-1]['dds']:
                     last_dd = self.steps[-1]['dds'][-1]
                     if 'payload' not in last_dd: last_dd['payload'] = []
-                    last_dd['payload'].append(stmt.replace("*PAYLOAD* ", ""))
+                    last_dd['payload'].append(item[1])
                 continue
+            if tree is None: continue
+            stmt = item[1]
 
             try:
-                tree = self.parser.parse(stmt)
                 if tree['type'] == 'EXEC':
                     self.current_step = {"step_info": tree, "dds": [], "raw_stmt": stmt}
                     if proc_stack:
@@ -448,6 +644,9 @@ class JCLParserManager:
 # OUTPUT MANAGERS
 # =============================================================================
 
+# DCB subparameters stored in their own DATA_ALLOCATIONS columns rather than dcb_attributes
+_DCB_STD = frozenset(('LRECL', 'RECFM', 'BLKSIZE'))
+
 class DatabaseManager:
     def __init__(self, db_config, drop_tables=False):
         self.dbname = db_config.get("database", "unknown")
@@ -520,6 +719,10 @@ class DatabaseManager:
             cursor.execute("SELECT COALESCE(MAX(step_id), 0) FROM STEPS WHERE project_id = %s", (project_id,))
             step_id_counter = cursor.fetchone()[0]
 
+            # STEPS rows are batched; DATA_ALLOCATIONS rows are streamed through COPY as CSV.
+            # None is written as the \N marker so it loads as NULL while '' stays an empty string.
+            steps_rows, dd_buf = [], io.StringIO()
+            dd_writer = csv.writer(dd_buf, lineterminator="\n")
             for step in structured_data:
                 step_id_counter += 1
                 info = step['step_info']; params = info['params']
@@ -527,10 +730,7 @@ class DatabaseManager:
                 if log_enabled:
                     print(f"{step_id_counter} {step['raw_stmt']}")
 
-                cursor.execute("""
-                    INSERT INTO STEPS (project_id, step_id, step_name, proc_step_name, program_name, proc_name, parameters, cond_logic)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-                """, (
+                steps_rows.append((
                     project_id, step_id_counter, info['final_step_name'], info['final_proc_step_name'], 
                     params.get('PGM'), info['final_proc_name'], params.get('PARM'), info['merged_cond_logic']
                 ))
@@ -545,27 +745,36 @@ class DatabaseManager:
                     if log_enabled:
                         print(f"  {ds_id_counter} {dd['raw_stmt']}")
                     
-                    p = dd['params']
-                    dsn = p.get('DSN')
-                    if p.get('DUMMY'): dsn = "(dummy)"
-                    elif p.get('INSTREAM'): dsn = "(input stream)"
+                    p = dd['params']; get = p.get
+                    dsn, dummy = get('DSN'), get('DUMMY')
+                    if dummy: dsn = "(dummy)"
+                    elif get('INSTREAM'): dsn = "(input stream)"
                     elif 'SYSOUT' in p: dsn = "(output stream)"
                     elif not dsn: dsn = "(work_ds)"
                     
-                    disp = p.get('DISP', [])
+                    disp = get('DISP', [])
                     status, normal, abnormal = (disp[0] if len(disp)>0 else None), (disp[1] if len(disp)>1 else None), (disp[2] if len(disp)>2 else None)
-                    lrecl, recfm, blksize = p.get('LRECL'), p.get('RECFM'), p.get('BLKSIZE')
-                    dcb_val, extra_dcb = p.get('DCB'), {}
+                    lrecl, recfm, blksize = get('LRECL'), get('RECFM'), get('BLKSIZE')
+                    dcb_val, extra_dcb = get('DCB'), {}
                     if isinstance(dcb_val, dict):
                         lrecl, recfm, blksize = lrecl or dcb_val.get('LRECL'), recfm or dcb_val.get('RECFM'), blksize or dcb_val.get('BLKSIZE')
-                        extra_dcb = {k:v for k,v in dcb_val.items() if k not in ('LRECL','RECFM','BLKSIZE')}
-                    cursor.execute("""
-                        INSERT INTO DATA_ALLOCATIONS (project_id, step_id, ds_id, dd_name, allocation_offset, dsn, disp_status, disp_normal_term, disp_abnormal_term, unit, vol_ser, is_dummy, instream_ref, lrecl, blksize, recfm, dcb_attributes)
-                        VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)
-                    """, (
-                        project_id, step_id_counter, ds_id_counter, last_dd_name, allocation_offset, dsn, status, normal, abnormal, p.get('UNIT'), p.get('VOL'),
-                        bool(p.get('DUMMY')), "\n".join(dd.get('payload', [])), lrecl, blksize, recfm, Json(extra_dcb)
-                    ))
+                        extra_dcb = {k:v for k,v in dcb_val.items() if k not in _DCB_STD}
+                    dd_writer.writerow([r"\N" if v is None else v for v in (
+                        project_id, step_id_counter, ds_id_counter, last_dd_name, allocation_offset, dsn, status, normal, abnormal, get('UNIT'), get('VOL'),
+                        bool(dummy), "\n".join(dd.get('payload', [])), lrecl, blksize, recfm, json.dumps(extra_dcb)
+                    )])
+
+            if steps_rows:
+                execute_values(cursor, """
+                    INSERT INTO STEPS (project_id, step_id, step_name, proc_step_name, program_name, proc_name, parameters, cond_logic)
+                    VALUES %s
+                """, steps_rows, page_size=500)
+            if dd_buf.tell():
+                dd_buf.seek(0)
+                cursor.copy_expert("""
+                    COPY DATA_ALLOCATIONS (project_id, step_id, ds_id, dd_name, allocation_offset, dsn, disp_status, disp_normal_term, disp_abnormal_term, unit, vol_ser, is_dummy, instream_ref, lrecl, blksize, recfm, dcb_attributes)
+                    FROM STDIN WITH (FORMAT CSV, QUOTE '"', NULL '\\N')
+                """, dd_buf)
         self.conn.commit()
 
 def save_as_json(project_name, structured_data, log_enabled=False):
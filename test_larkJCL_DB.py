@@ -0,0 +1,73 @@
+import pytest
+
+from larkJCL_DB import JCLParserManager, JCLPreprocessor, _PARSER
+
+
+def make_preprocessor(symbols, **config):
+    pre = JCLPreprocessor(config)
+    for name, value in symbols.items():
+        pre.update_symbols(f"// SET {name}={value}")
+    return pre
+
+
+@pytest.mark.parametrize("symbols, stmt, expected", [
+    ({"HLQ": "PROD"}, "//D1 DD DSN=&HLQ..OUT", "//D1 DD DSN=PROD.OUT"),
+    ({"HLQ": "PROD"}, "//D1 DD DSN=&HLQ.OUT", "//D1 DD DSN=PRODOUT"),
+    ({"HLQ": "T1", "HLQX": "T2"}, "//D1 DD DSN=&HLQX.&HLQ", "//D1 DD DSN=T2T1"),
+    # Nested values resolve without re-scanning the text around the reference
+    ({"A": "&HLQ", "HLQ": "T1", "HLQX": "WRONG"}, "//D1 DD DSN=&A.X", "//D1 DD DSN=T1X"),
+    ({"A": "&HLQ", "HLQ": "Z"}, "//D1 DD DSN=&A..X", "//D1 DD DSN=Z.X"),
+    ({"A": "&HLQ..OUT", "HLQ": "Z"}, "//D1 DD DSN=&A", "//D1 DD DSN=Z.OUT"),
+    # Substituted text is not a new reference
+    ({"A": "&", "B": "X"}, "//D1 DD DSN=&A.B", "//D1 DD DSN=&B"),
+    # Self and mutual references stay literal instead of expanding
+    ({"A": "&A&A"}, "//D1 DD DSN=&A", "//D1 DD DSN=&A&A"),
+    ({"A": "&B", "B": "&A"}, "//D1 DD DSN=&A", "//D1 DD DSN=&A"),
+])
+def test_apply_symbolics(symbols, stmt, expected):
+    assert make_preprocessor(symbols).apply_symbolics(stmt) == expected
+
+
+def test_proc_default_references_set_symbol(tmp_path):
+    (tmp_path / "MAIN.jcl").write_text("//J JOB\n// SET HLQ=PROD\n//S1 EXEC NESTP\n")
+    (tmp_path / "NESTP.jcl").write_text("//NESTP PROC OUTDSN=&HLQ..OUT\n//D1 DD DSN=&OUTDSN,DISP=SHR\n")
+    pre = JCLPreprocessor({"PATH": str(tmp_path), "EXT": "jcl"})
+    stmts = [item[1] for item in pre.preprocess_file(pre.resolve_path("MAIN", True)) if item[0] == "STMT"]
+    assert "//D1 DD DSN=PROD.OUT,DISP=SHR" in stmts
+
+
+PLAIN_CARDS = [
+    "//S1 EXEC PGM=IEFBR14",
+    "//S1 EXEC PGM=IEFBR14,REGION=0M,TIME=5",
+    "//S1 EXEC MYPROC",
+    "//S1 EXEC MYPROC,HLQ=PROD,OUT=A.B",
+    "//S1 EXEC PROC=MYPROC,COND=4",
+    "// EXEC PGM=SORT,PARM=X",
+    "//IN DD DSN=PROD.DATA.SET,DISP=SHR",
+    "//IN DD DSNAME=PROD.DATA,DISP=OLD,UNIT=SYSDA",
+    "//OUT DD DSN=A.B,DISP=NEW,LRECL=080,BLKSIZE=27920,RECFM=FB,DSORG=PS",
+    "//SYSIN DD *",
+    "//SYSIN DD DATA,DLM=$$",
+    "//NULL DD DUMMY",
+    "//SYSPRINT DD SYSOUT=*",
+    "// DD DSN=CONCAT.LIB,DISP=SHR",
+]
+
+
+@pytest.mark.parametrize("card", PLAIN_CARDS)
+def test_parse_simple_matches_grammar(card):
+    fast = JCLParserManager().parse_simple(card)
+    assert fast is not None
+    assert fast == _PARSER.parse(card)[0]
+
+
+@pytest.mark.parametrize("card", [
+    "//S1 EXEC MYPROC,",
+    "//S1 EXEC HLQ=PROD",
+    "//DDIN DD DSN=A.B,DISP=SHR",
+    "//IN DD DSN=&HLQ..DATA,DISP=SHR",
+    "//IN DD DSN=A.B,DISP=(NEW,CATLG)",
+    "//OUT DD DSN=A.B,RECFM=XB",
+])
+def test_parse_simple_defers_to_grammar(card):
+    assert JCLParserManager().parse_simple(card) is None